@@ -0,0 +1,57 @@
+# Ahead-of-time build of the fast_windows kernels, so a fresh Streamlit
+# worker imports compiled code instead of paying Numba's JIT on first plot.
+# Run once at install time:
+#
+#     python build_indicators.py
+#
+# This writes an `indicators` extension module next to the app, which
+# stock_analysis_app.py prefers over the JIT-compiled fast_windows.
+import os
+
+import numpy as np
+from numba.pycc import CC
+
+import fast_windows
+
+cc = CC("indicators")
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+@cc.export("sma", "f4[:](f4[:], i8)")
+def sma(close, n):
+    return fast_windows.rolling_mean(close, n)
+
+
+@cc.export("bbands", "UniTuple(f4[:], 3)(f4[:], i8, f8)")
+def bbands(close, n, k):
+    return fast_windows.bbands(close, n, k)
+
+
+@cc.export("rsi", "f4[:](f4[:], i8)")
+def rsi(close, n):
+    return fast_windows.wilder_rsi(close, n)
+
+
+@cc.export("ema", "f4[:](f4[:], i8)")
+def ema(close, n):
+    # Only exported for callers of the compiled module; the app doesn't plot
+    # an EMA, so it isn't a fast_windows kernel that every import would pay for.
+    # Alpha = 2 / (n + 1), seeded with the simple mean of the first n values
+    size = len(close)
+    out = np.full(size, np.nan, dtype=np.float32)
+    if n < 1 or size < n:
+        return out
+    alpha = 2.0 / (n + 1)
+    e = 0.0
+    for i in range(n):
+        e += np.float64(close[i])
+    e /= n
+    out[n - 1] = e
+    for i in range(n, size):
+        e += alpha * (np.float64(close[i]) - e)
+        out[i] = e
+    return out
+
+
+if __name__ == "__main__":
+    cc.compile()
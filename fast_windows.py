@@ -0,0 +1,78 @@
+import numpy as np
+from numba import njit
+
+
+# Sliding-window kernels: keep a running sum (and sum of squares) as the
+# window moves, so each output costs O(1) instead of O(window).
+# Prices come in as float32, but each element is widened to float64 before
+# it is added to the running sums so they keep full precision.
+@njit("float32[:](float32[:], int64)", cache=True)
+def rolling_mean(a, w):
+    n = len(a)
+    out = np.full(n, np.nan, dtype=np.float32)
+    if w < 1 or n < w:
+        return out
+    s = 0.0
+    for i in range(w):
+        s += np.float64(a[i])
+    out[w - 1] = s / w
+    for i in range(w, n):
+        s += np.float64(a[i]) - np.float64(a[i - w])
+        out[i] = s / w
+    return out
+
+
+@njit("UniTuple(float32[:], 3)(float32[:], int64, float64)", cache=True)
+def bbands(close, w, k):
+    # Bollinger Bands in a single pass: mean and sample std share the same
+    # running sums, so the window is only walked once
+    n = len(close)
+    mean = np.full(n, np.nan, dtype=np.float32)
+    up = np.full(n, np.nan, dtype=np.float32)
+    lo = np.full(n, np.nan, dtype=np.float32)
+    if w < 1 or n < w:
+        return mean, up, lo
+    s = 0.0
+    s2 = 0.0
+    for i in range(n):
+        x = np.float64(close[i])
+        s += x
+        s2 += x * x
+        if i >= w:
+            y = np.float64(close[i - w])
+            s -= y
+            s2 -= y * y
+        if i >= w - 1:
+            m = s / w
+            mean[i] = m
+            if w > 1:
+                sd = np.sqrt(max((s2 - s * m) / (w - 1), 0.0))
+                up[i] = m + k * sd
+                lo[i] = m - k * sd
+    return mean, up, lo
+
+
+@njit("float32[:](float32[:], int64)", cache=True)
+def wilder_rsi(close, n):
+    # Wilder's RSI: seed the average gain/loss over the first n diffs, then
+    # smooth with the RMA recurrence avg = (avg * (n - 1) + x) / n
+    size = len(close)
+    out = np.full(size, np.nan, dtype=np.float32)
+    if n < 1 or size <= n:
+        return out
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, n + 1):
+        d = np.float64(close[i]) - np.float64(close[i - 1])
+        avg_gain += max(d, 0.0)
+        avg_loss += max(-d, 0.0)
+    avg_gain /= n
+    avg_loss /= n
+    out[n] = 100.0 if avg_loss == 0.0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    for i in range(n + 1, size):
+        d = np.float64(close[i]) - np.float64(close[i - 1])
+        avg_gain = (avg_gain * (n - 1) + max(d, 0.0)) / n
+        avg_loss = (avg_loss * (n - 1) + max(-d, 0.0)) / n
+        out[i] = 100.0 if avg_loss == 0.0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
@@ -0,0 +1,89 @@
+import numpy as np
+
+try:
+    from scipy.ndimage import uniform_filter1d
+except ImportError:
+    uniform_filter1d = None
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+
+# Pure NumPy versions of the fast_windows kernels, used when Numba isn't
+# installed. Same inputs and float32 outputs, leading NaNs where the window
+# isn't full yet.
+def _window_mean(a, w):
+    return np.convolve(a, np.ones(w) / w, 'valid')
+
+
+def _left_pad(valid, n):
+    out = np.full(n, np.nan, dtype=np.float32)
+    out[n - len(valid):] = valid
+    return out
+
+
+def rolling_mean(a, w):
+    n = len(a)
+    if w < 1 or n < w:
+        return np.full(n, np.nan, dtype=np.float32)
+    if uniform_filter1d is None:
+        return _left_pad(_window_mean(a.astype(np.float64), w), n)
+    # scipy's box filter is a compiled O(n) running sum; shifting the origin
+    # by (w - 1) // 2 makes each window end at the current sample
+    out = uniform_filter1d(a.astype(np.float64), size=w, mode='nearest', origin=(w - 1) // 2)
+    out[:w - 1] = np.nan
+    return out.astype(np.float32)
+
+
+def bbands(close, w, k):
+    n = len(close)
+    if w < 1 or n < w:
+        empty = np.full(n, np.nan, dtype=np.float32)
+        return empty, empty.copy(), empty.copy()
+    x = close.astype(np.float64)
+    m = _window_mean(x, w)
+    if w > 1:
+        # Sample variance (ddof=1) from the windowed mean of squares
+        var = (_window_mean(x * x, w) - m * m) * w / (w - 1)
+        sd = np.sqrt(np.maximum(var, 0.0))
+        up = _left_pad(m + k * sd, n)
+        lo = _left_pad(m - k * sd, n)
+    else:
+        up = np.full(n, np.nan, dtype=np.float32)
+        lo = up.copy()
+    return _left_pad(m, n), up, lo
+
+
+def _wilder_smooth(seed, x, n):
+    # RMA recurrence avg = (avg * (n - 1) + x) / n starting from seed; as a
+    # first-order IIR filter lfilter runs it in C, otherwise loop in Python
+    if lfilter is not None:
+        a = (n - 1) / n
+        out, _ = lfilter([1.0 / n], [1.0, -a], x, zi=[a * seed])
+        return out
+    out = np.empty(len(x))
+    avg = seed
+    for i, v in enumerate(x):
+        avg = (avg * (n - 1) + v) / n
+        out[i] = avg
+    return out
+
+
+def rsi(close, n):
+    # Wilder's RSI, same as fast_windows.wilder_rsi: gains/losses from one
+    # np.diff, seeded with their mean over the first n diffs, then smoothed
+    size = len(close)
+    if n < 1 or size <= n:
+        return np.full(size, np.nan, dtype=np.float32)
+    d = np.diff(close.astype(np.float64))
+    gain = np.maximum(d, 0.0)
+    loss = np.maximum(-d, 0.0)
+    seed_gain = gain[:n].mean()
+    seed_loss = loss[:n].mean()
+    avg_gain = np.concatenate([[seed_gain], _wilder_smooth(seed_gain, gain[n:], n)])
+    avg_loss = np.concatenate([[seed_loss], _wilder_smooth(seed_loss, loss[n:], n)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.where(avg_loss == 0.0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+    return _left_pad(values, size)
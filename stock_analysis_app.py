@@ -1,175 +1,454 @@
-import yfinance as yf
 import streamlit as st
 import datetime
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import plotly.graph_objects as go
-import plotly.express as px
+from plotly.subplots import make_subplots
+try:
+    # Ahead-of-time build from build_indicators.py, no JIT on startup
+    from indicators import bbands, sma as rolling_mean, rsi
+except ImportError:
+    try:
+        from fast_windows import bbands, rolling_mean, wilder_rsi as rsi
+    except ImportError:
+        # Numba isn't installed: fall back to the pure NumPy kernels
+        from numpy_windows import bbands, rolling_mean, rsi
+
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+CACHE_DIR = Path("~/.cache").expanduser()
+SP500_CACHE_TTL = 7 * 86400
+RECENT_TICKERS = 5
+PREFETCH_WORKERS = 4
+CANDLE_CACHE_TTL = 3600
+DEFAULT_TICKER = "MMM"
+PREVIEW_ROWS = 100
+CANDLE_OVERLAP_DAYS = 7
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Adj Close')
+DEFAULT_START_DATE = datetime.date(2019, 1, 1)
+
+def scrape_sp500_table(url):
+    # Pull just the first two columns of the constituents table instead of
+    # letting pd.read_html parse every table on the page
+    import lxml.html
+    import requests
+
+    r = requests.get(url, timeout=10, headers={"User-Agent": "stock-analysis-app"})
+    r.raise_for_status()
+    tree = lxml.html.fromstring(r.content)
+    rows = tree.xpath('//table[@id="constituents"]//tr')
+    tickers = []
+    names = []
+    for row in rows:
+        cells = row.xpath('./td')
+        if len(cells) < 2:
+            continue
+        tickers.append(cells[0].text_content().strip())
+        names.append(cells[1].text_content().strip())
+    if not tickers:
+        raise ValueError(f"No S&P 500 constituents found at {url}; the page layout may have changed")
+    return pd.DataFrame({"Symbol": tickers, "Security": names})
 
 # Cache functions
 @st.cache_data
 def get_sp500_components():
-    df = pd.read_html("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies")
-    df = df[0]
+    # The constituents list rarely changes, so keep it on disk between restarts
+    # (a stale copy still beats no list when the refresh fails)
+    path = CACHE_DIR / "sp500.parquet"
+    if path.exists() and (time.time() - path.stat().st_mtime) < SP500_CACHE_TTL:
+        df = pd.read_parquet(path)
+    else:
+        try:
+            df = scrape_sp500_table(SP500_URL)
+        except (OSError, ValueError):
+            if not path.exists():
+                raise
+            df = pd.read_parquet(path)
+        else:
+            write_parquet(df, path)
     tickers = df["Symbol"].to_list()
     tickers_companies_dict = dict(zip(df["Symbol"], df["Security"]))
     return tickers, tickers_companies_dict
 
-@st.cache_data
-def load_data(symbol, start, end):
-    data = yf.download(symbol, start, end)
-    data.columns = data.columns.get_level_values(0)
+def fetch_candles(symbol, start, end):
+    # The single-ticker history call skips the corporate-actions columns and
+    # the multi-symbol panel alignment of yf.download, and has flat columns
+    import yfinance as yf
+
+    data = yf.Ticker(symbol).history(start=start, end=end, auto_adjust=False, actions=False, prepost=False)
+    # history() stamps the exchange timezone; keep plain dates as before
+    if isinstance(data.index, pd.DatetimeIndex) and data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
     return data
 
-@st.cache_data
-def convert_df_to_csv(df):
-    return df.to_csv().encode("utf-8")
+def downcast_prices(data):
+    # float32 is plenty for quoted prices and halves the bytes every
+    # indicator kernel and the plotly payload have to move
+    data = data.copy()
+    for col in ('Open', 'High', 'Low', 'Close', 'Adj Close'):
+        if col in data:
+            data[col] = data[col].astype(np.float32)
+    if 'Volume' in data:
+        data['Volume'] = pd.to_numeric(data['Volume'], downcast='integer')
+    return data
 
-# Sidebar
-st.sidebar.header("Stock Parameters")
-available_tickers, tickers_companies_dict = get_sp500_components()
-ticker = st.sidebar.selectbox("Ticker", available_tickers, format_func=tickers_companies_dict.get)
-start_date = st.sidebar.date_input("Start date", datetime.date(2019, 1, 1))
-end_date = st.sidebar.date_input("End date", datetime.date.today())
-if start_date > end_date:
-    st.sidebar.error("The end date must fall after the start date")
+def write_parquet(df, path):
+    # Write to a temp file next to the target and swap it in, so prefetch
+    # threads and other sessions never read a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
-# Technical Analysis Parameters
-st.sidebar.header("Technical Analysis Parameters")
-volume_flag = st.sidebar.checkbox(label="Add volume")
-exp_sma = st.sidebar.expander("SMA")
-sma_flag = exp_sma.checkbox(label="Add SMA")
-sma_periods = exp_sma.number_input(label="SMA Periods", min_value=1, max_value=50, value=20, step=1)
+def matches_cache(cached, fresh):
+    # Yahoo split-adjusts OHLC and dividend-adjusts Adj Close retroactively,
+    # so re-downloaded days that no longer match mean the cached history is
+    # stale. The last cached day is skipped: it may have been a partial bar
+    last = cached.index.max()
+    overlap = fresh.index.intersection(cached.index)
+    overlap = overlap[overlap < last]
+    cols = [col for col in PRICE_COLUMNS if col in cached and col in fresh]
+    if overlap.empty or not cols:
+        return True
+    return np.allclose(cached.loc[overlap, cols], fresh.loc[overlap, cols], rtol=1e-6, equal_nan=True)
 
-exp_bb = st.sidebar.expander("Bollinger Bands")
-bb_flag = exp_bb.checkbox(label="Add Bollinger Bands")
-bb_periods = exp_bb.number_input(label="BB Periods", min_value=1, max_value=50, value=20, step=1)
-bb_std = exp_bb.number_input(label="# of standard deviations", min_value=1, max_value=4, value=2, step=1)
+# No cache spinner: prefetch threads call this without a ScriptRunContext,
+# so the foreground call site shows its own st.spinner instead
+@st.cache_data(ttl=CANDLE_CACHE_TTL, show_spinner=False)
+def load_data(symbol, start, end):
+    # Candles are kept on disk per (ticker, start date); only the tail after
+    # the last cached day is downloaded, re-fetching a few overlapping days to
+    # catch splits and dividends that re-price the whole history
+    path = CACHE_DIR / "candles" / f"{symbol}_{start}.parquet"
+    if not path.exists():
+        data = fetch_candles(symbol, start, end)
+        if not data.empty:
+            write_parquet(data, path)
+        return downcast_prices(data)
+    data = pd.read_parquet(path)
+    last = data.index.max()
+    if (last + pd.Timedelta(days=1)).date() < end:
+        overlap_start = max((last - pd.Timedelta(days=CANDLE_OVERLAP_DAYS)).date(), start)
+        fresh = fetch_candles(symbol, overlap_start, end)
+        if not fresh.empty:
+            if matches_cache(data, fresh):
+                data = pd.concat([data[~data.index.isin(fresh.index)], fresh]).sort_index()
+                write_parquet(data, path)
+            else:
+                rebuilt = fetch_candles(symbol, start, end)
+                if not rebuilt.empty:
+                    data = rebuilt
+                    write_parquet(data, path)
+    return downcast_prices(data[data.index < pd.Timestamp(end)])
 
-exp_rsi = st.sidebar.expander("Relative Strength Index")
-rsi_flag = exp_rsi.checkbox(label="Add RSI")
-rsi_periods = exp_rsi.number_input(label="RSI Periods", min_value=1, max_value=50, value=20, step=1)
-rsi_upper = exp_rsi.number_input(label="RSI Upper", min_value=50, max_value=90, value=70, step=1)
-rsi_lower = exp_rsi.number_input(label="RSI Lower", min_value=10, max_value=50, value=30, step=1)
+# Indicators take the raw bytes of the float32 close array, which Streamlit
+# hashes cheaply, so unrelated widget changes reuse the cached results
+def close_from_bytes(close_bytes):
+    # frombuffer gives a read-only view, which the typed kernels won't accept
+    return np.frombuffer(close_bytes, dtype=np.float32).copy()
 
-# Title
-st.title("A simple web app for technical analysis")
-st.write("""
-### User manual
-* You can select any company from the S&P 500 constituents
-""")
+@st.cache_data
+def compute_sma(close_bytes, period):
+    return rolling_mean(close_from_bytes(close_bytes), period)
 
-# Load stock data
-df = load_data(ticker, start_date, end_date)
+@st.cache_data
+def compute_bbands(close_bytes, period, num_std):
+    return bbands(close_from_bytes(close_bytes), period, float(num_std))
 
-# Preview Data
-data_exp = st.expander("Preview data")
-available_cols = df.columns.tolist()
-columns_to_show = data_exp.multiselect("Columns", available_cols, default=available_cols)
-data_exp.dataframe(df[columns_to_show])
-csv_file = convert_df_to_csv(df[columns_to_show])
-data_exp.download_button(
-    label="Download selected as CSV",
-    data=csv_file,
-    file_name=f"{ticker}_stock_prices.csv",
-    mime="text/csv",
-)
+@st.cache_data
+def compute_rsi(close_bytes, period):
+    return rsi(close_from_bytes(close_bytes), period)
 
-# Debugging: Check if data is loaded correctly
-st.write(f"Data loaded for {ticker}:")
-st.write(df.head())
+@st.cache_data
+def convert_df_to_csv(df):
+    # pyarrow writes UTF-8 bytes directly, skipping the intermediate Python str.
+    # Keep the file looking like df.to_csv(): the index is the first column,
+    # daily candles go out as plain dates, and the header isn't quoted
+    index = df.index
+    if isinstance(index, pd.DatetimeIndex) and (index == index.normalize()).all():
+        df = df.set_axis(pd.Index(index.date, name=index.name))
+    buf = pa.BufferOutputStream()
+    pa_csv.write_csv(
+        pa.Table.from_pandas(df.reset_index(), preserve_index=False),
+        buf,
+        write_options=pa_csv.WriteOptions(quoting_header="none"),
+    )
+    return buf.getvalue().to_pybytes()
 
-# Ensure that the index is a DatetimeIndex
-if not isinstance(df.index, pd.DatetimeIndex):
-    st.error("The data index is not a DatetimeIndex, which is required for time series plotting.")
-else:
-    st.write(f"Index is a {type(df.index)}")
+@st.cache_resource
+def prefetch_pool():
+    # One pool per server process, shared by every session and rerun. Its
+    # threads have no ScriptRunContext; they only fill load_data's cache
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS), {}, threading.Lock()
 
-# Plotting the data using plotly
-title_str = f"{tickers_companies_dict[ticker]}'s stock price"
+def prefetch(tickers, start, end):
+    # Queue background load_data calls for tickers the user is likely to
+    # view, skipping ones already warmed within the cache TTL
+    executor, warmed, lock = prefetch_pool()
+    now = time.time()
+    with lock:
+        for symbol in tickers:
+            key = (symbol, start, end)
+            if now - warmed.get(key, 0.0) < CANDLE_CACHE_TTL:
+                continue
+            warmed[key] = now
+            executor.submit(load_data, symbol, start, end)
 
-# Create the figure
-fig = go.Figure()
+def default_ticker():
+    # The ticker the selectbox will show first: the head of the cached S&P
+    # list if there is one, so it can download while the list is fetched
+    path = CACHE_DIR / "sp500.parquet"
+    if path.exists():
+        try:
+            return pd.read_parquet(path, columns=["Symbol"])["Symbol"].iat[0]
+        except (OSError, ValueError, IndexError):
+            pass
+    return DEFAULT_TICKER
 
-# Check if data has valid values
-if df.empty:
-    st.error("No data available for the selected stock symbol and date range.")
-else:
+# Render blocks run as fragments, so interacting with a widget inside one
+# (e.g. the preview column picker) reruns only that block
+@st.fragment
+def render_preview(df, ticker):
+    data_exp = st.expander("Preview data")
+    available_cols = df.columns.tolist()
+    columns_to_show = data_exp.multiselect("Columns", available_cols, default=available_cols)
+    selected = df[columns_to_show]
+    # Long histories only ship the first and last rows to the browser;
+    # the download below still contains everything
+    if len(selected) > 5 * PREVIEW_ROWS:
+        preview = pd.concat([selected.head(PREVIEW_ROWS), selected.tail(PREVIEW_ROWS)])
+    else:
+        preview = selected
+    data_exp.dataframe(preview, width="stretch")
+    csv_file = convert_df_to_csv(selected)
+    data_exp.download_button(
+        label="Download selected as CSV",
+        data=csv_file,
+        file_name=f"{ticker}_stock_prices.csv",
+        mime="text/csv",
+    )
+
+@st.cache_data(max_entries=32)
+def build_fig_dict(idx_bytes, ohlc_bytes, volume_bytes, volume_dtype, ticker, title_str, flags, params):
+    # The whole figure is a pure function of the price arrays and the sidebar
+    # settings, so reruns with unchanged inputs skip trace construction
+    idx = np.frombuffer(idx_bytes, dtype='datetime64[ns]')
+    o, h, l, c = np.frombuffer(ohlc_bytes, dtype=np.float32).reshape(4, -1)
+    volume = np.frombuffer(volume_bytes, dtype=volume_dtype)
+    close_bytes = c.tobytes()
+
+    # Collect every trace (and the subplot row it goes in) first so they are
+    # added and validated in one call
     # Candlestick trace (Open, High, Low, Close)
-    fig.add_trace(go.Candlestick(
-        x=df.index,
-        open=df['Open'],
-        high=df['High'],
-        low=df['Low'],
-        close=df['Close'],
+    traces = [go.Candlestick(
+        x=idx,
+        open=o,
+        high=h,
+        low=l,
+        close=c,
         name="Price"
-    ))
+    )]
+    trace_rows = [1]
+    shapes = []
 
     # Volume trace (if enabled)
-    if volume_flag:
-        fig.add_trace(go.Bar(
-            x=df.index,
-            y=df['Volume'],
+    if flags['volume']:
+        traces.append(go.Bar(
+            x=idx,
+            y=volume,
             name="Volume",
             marker_color='rgba(255, 153, 51, 0.6)'
         ))
+        trace_rows.append(2)
 
     # Add SMA (if selected)
-    if sma_flag:
-        sma = df['Close'].rolling(window=sma_periods).mean()
-        fig.add_trace(go.Scatter(
-            x=df.index,
+    if flags['sma']:
+        sma = compute_sma(close_bytes, params['sma_periods'])
+        traces.append(go.Scatter(
+            x=idx,
             y=sma,
             mode='lines',
-            name=f"SMA {sma_periods}",
+            name=f"SMA {params['sma_periods']}",
             line=dict(color='blue')
         ))
+        trace_rows.append(1)
 
     # Add Bollinger Bands (if selected)
-    if bb_flag:
-        rolling_mean = df['Close'].rolling(window=bb_periods).mean()
-        rolling_std = df['Close'].rolling(window=bb_periods).std()
-        upper_band = rolling_mean + bb_std * rolling_std
-        lower_band = rolling_mean - bb_std * rolling_std
-
-        fig.add_trace(go.Scatter(
-            x=df.index,
+    if flags['bb']:
+        middle_band, upper_band, lower_band = compute_bbands(close_bytes, params['bb_periods'], params['bb_std'])
+        traces.append(go.Scatter(
+            x=idx,
+            y=middle_band,
+            mode='lines',
+            name=f"BB Middle {params['bb_periods']}",
+            line=dict(color='red', width=1)
+        ))
+        traces.append(go.Scatter(
+            x=idx,
             y=upper_band,
             mode='lines',
             name="Upper Bollinger Band",
             line=dict(color='red', dash='dash')
         ))
-        fig.add_trace(go.Scatter(
-            x=df.index,
+        traces.append(go.Scatter(
+            x=idx,
             y=lower_band,
             mode='lines',
             name="Lower Bollinger Band",
             line=dict(color='red', dash='dash')
         ))
+        trace_rows.extend([1, 1, 1])
 
     # Add RSI (if selected)
-    if rsi_flag:
-        rsi = 100 - (100 / (1 + (df['Close'].pct_change().dropna() + 1).rolling(window=rsi_periods).mean()))
-        fig.add_trace(go.Scatter(
-            x=df.index,
+    if flags['rsi']:
+        rsi = compute_rsi(close_bytes, params['rsi_periods'])
+        traces.append(go.Scatter(
+            x=idx,
             y=rsi,
             mode='lines',
-            name=f"RSI {rsi_periods}",
+            name=f"RSI {params['rsi_periods']}",
             line=dict(color='green')
         ))
-        fig.add_hline(y=rsi_upper, line=dict(color='red', dash='dot'))
-        fig.add_hline(y=rsi_lower, line=dict(color='red', dash='dot'))
+        trace_rows.append(1)
+        # Same horizontal lines fig.add_hline would draw, but set in the layout
+        for level in (params['rsi_upper'], params['rsi_lower']):
+            shapes.append(dict(
+                type='line', xref='x domain', yref='y',
+                x0=0, x1=1, y0=level, y1=level,
+                line=dict(color='red', dash='dot')
+            ))
 
-    # Update layout
-    config = {'scrollZoom': True}
-    fig.update_layout(
+    # Create the figure; volume gets its own row so it keeps its own y range
+    # instead of squashing the candlesticks
+    if flags['volume']:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.8, 0.2], vertical_spacing=0.02)
+    else:
+        fig = make_subplots(rows=1, cols=1)
+    fig.add_traces(traces, rows=trace_rows, cols=[1] * len(traces))
+    layout = dict(
         title=title_str,
-        xaxis_title="Date",
         yaxis_title="Price",
         template="plotly_dark",
         xaxis_rangeslider_visible=False,
-        dragmode = 'pan'
+        dragmode='pan',
+        uirevision=ticker,
+        shapes=shapes
+    )
+    if flags['volume']:
+        layout.update(xaxis2_title="Date", xaxis2_rangeslider_visible=False, yaxis2_title="Volume")
+    else:
+        layout.update(xaxis_title="Date")
+    fig.update_layout(**layout)
+
+    return fig.to_dict()
+
+@st.fragment
+def render_chart(df, ticker, title_str, flags, params):
+    # Check if data has valid values
+    if df.empty:
+        st.error("No data available for the selected stock symbol and date range.")
+        return
+
+    # Hand the builder raw buffers: cheap for Streamlit to hash, and plotly
+    # serializes ndarrays without boxing each value
+    idx = df.index.to_numpy(dtype='datetime64[ns]')
+    ohlc = np.stack([df[col].to_numpy(dtype=np.float32) for col in ('Open', 'High', 'Low', 'Close')])
+    volume = df['Volume'].to_numpy()
+    fig_dict = build_fig_dict(
+        idx.tobytes(), ohlc.tobytes(), volume.tobytes(), volume.dtype.str, ticker, title_str, flags, params
     )
-    fig.show(config = config)
 
     # Display plot
-    st.plotly_chart(fig)
+    st.plotly_chart(go.Figure(fig_dict), width="stretch", config={'scrollZoom': True})
+
+# Sidebar
+if "recent_tickers" not in st.session_state:
+    # First run of the session: download the default ticker in the background
+    # while the S&P list is fetched below, instead of one after the other
+    st.session_state["recent_tickers"] = []
+    prefetch([default_ticker()], DEFAULT_START_DATE, datetime.date.today())
+recent_tickers = st.session_state["recent_tickers"]
+available_tickers, tickers_companies_dict = get_sp500_components()
+st.sidebar.header("Stock Parameters")
+ticker = st.sidebar.selectbox("Ticker", available_tickers, format_func=tickers_companies_dict.get)
+start_date = st.sidebar.date_input("Start date", DEFAULT_START_DATE)
+end_date = st.sidebar.date_input("End date", datetime.date.today())
+if start_date > end_date:
+    st.sidebar.error("The end date must fall after the start date")
+if ticker in recent_tickers:
+    recent_tickers.remove(ticker)
+recent_tickers.insert(0, ticker)
+del recent_tickers[RECENT_TICKERS:]
+# Keep the other recent tickers warm for the current date range
+prefetch(recent_tickers[1:], start_date, end_date)
+
+# Technical Analysis Parameters
+st.sidebar.header("Technical Analysis Parameters")
+volume_flag = st.sidebar.checkbox(label="Add volume")
+exp_sma = st.sidebar.expander("SMA")
+sma_flag = exp_sma.checkbox(label="Add SMA")
+sma_periods = exp_sma.number_input(label="SMA Periods", min_value=1, max_value=50, value=20, step=1)
+
+exp_bb = st.sidebar.expander("Bollinger Bands")
+bb_flag = exp_bb.checkbox(label="Add Bollinger Bands")
+bb_periods = exp_bb.number_input(label="BB Periods", min_value=1, max_value=50, value=20, step=1)
+bb_std = exp_bb.number_input(label="# of standard deviations", min_value=1, max_value=4, value=2, step=1)
+
+exp_rsi = st.sidebar.expander("Relative Strength Index")
+rsi_flag = exp_rsi.checkbox(label="Add RSI")
+rsi_periods = exp_rsi.number_input(label="RSI Periods", min_value=1, max_value=50, value=20, step=1)
+rsi_upper = exp_rsi.number_input(label="RSI Upper", min_value=50, max_value=90, value=70, step=1)
+rsi_lower = exp_rsi.number_input(label="RSI Lower", min_value=10, max_value=50, value=30, step=1)
+
+# Title
+st.title("A simple web app for technical analysis")
+st.write("""
+### User manual
+* You can select any company from the S&P 500 constituents
+""")
+
+# Load stock data
+with st.spinner(f"Loading {ticker} prices..."):
+    df = load_data(ticker, start_date, end_date)
+
+# Preview Data
+render_preview(df, ticker)
+
+# Debugging: Check if data is loaded correctly
+st.write(f"Data loaded for {ticker}:")
+st.write(df.head())
+
+# Ensure that the index is a DatetimeIndex
+if not isinstance(df.index, pd.DatetimeIndex):
+    st.error("The data index is not a DatetimeIndex, which is required for time series plotting.")
+else:
+    st.write(f"Index is a {type(df.index)}")
+
+# Plotting the data using plotly
+title_str = f"{tickers_companies_dict[ticker]}'s stock price"
+render_chart(
+    df,
+    ticker,
+    title_str,
+    flags=dict(volume=volume_flag, sma=sma_flag, bb=bb_flag, rsi=rsi_flag),
+    params=dict(
+        sma_periods=sma_periods,
+        bb_periods=bb_periods,
+        bb_std=bb_std,
+        rsi_periods=rsi_periods,
+        rsi_upper=rsi_upper,
+        rsi_lower=rsi_lower,
+    ),
+)